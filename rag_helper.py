@@ -6,11 +6,11 @@ from langchain_community.document_loaders import PyPDFDirectoryLoader, Directory
 from langchain.text_splitter import CharacterTextSplitter
 from langchain_core.documents import Document
 from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import Chroma
 from langchain.chains import RetrievalQA
 from langchain_openai.llms import OpenAI
 from dotenv import load_dotenv
 from scraper import scrape_angelone_support_pages
+from sharded_index import build_sharded_retriever, tag_documents
 
 load_dotenv()
 OPENAI_GEN_LLM = OpenAI(temperature=0.5)
@@ -51,6 +51,7 @@ def generate_questions_for_chunk(doc: Document) -> Document:
 def load_and_process_docs():
     loader = PyPDFDirectoryLoader("sources")
     docs = loader.load()
+    tag_documents(docs, "pdf")
     text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=50)
     split_pdf_docs = text_splitter.split_documents(docs)
     processed_pdf_docs = [generate_questions_for_chunk(doc) for doc in split_pdf_docs]
@@ -60,6 +61,7 @@ def load_angelone_texts():
     scrape_angelone_support_pages()
     text_loader = DirectoryLoader("sources/angelone-support", glob="**/*.txt", loader_cls=TextLoader)
     text_docs = text_loader.load()
+    tag_documents(text_docs, "faq")
     text_text_splitter = CharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
     return text_text_splitter.split_documents(text_docs)
 
@@ -67,10 +69,7 @@ def init_rag():
     embeddings = OpenAIEmbeddings()
     documents = load_and_process_docs()
     documents.extend(load_angelone_texts())
-    db = Chroma.from_documents(documents, embeddings)
-    retriever = db.as_retriever(
-        search_type="similarity", search_kwargs={"k": 4}
-    )
+    retriever = build_sharded_retriever(documents, embeddings, k=4)
     llm = OpenAI(temperature=0)
     memory = ConversationBufferMemory(memory_key="chat_history", return_messages=True, output_key='answer')
     conversation_chain = ConversationalRetrievalChain.from_llm(
@@ -0,0 +1,271 @@
+import argparse
+import math
+import os
+import re
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List
+from langchain_community.document_loaders import PyPDFDirectoryLoader, DirectoryLoader, TextLoader
+from langchain.text_splitter import CharacterTextSplitter
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_community.vectorstores import Chroma
+from sharded_index import build_sharded_retriever, tag_documents
+
+# --- Configuration ---
+SOURCES_DIR = "sources"
+# Small checked-in FAQ set in the scraper's output format. FAQ_FIXTURE_QUERIES are labelled
+# against it, so it is the default FAQ corpus regardless of what has been scraped locally.
+FAQ_FIXTURE_DIR = "bench_fixtures/angelone-support"
+
+# Flat searches return this many chunks; recall@k for smaller k is read off the same ranking
+MAX_K = 10
+RECALL_AT = [1, 4, 10]
+# MRR only counts hits in the first MRR_AT results (init_rag's k), so every config is scored alike
+MRR_AT = 4
+# Timed passes over the query set, after one untimed warm-up pass
+LATENCY_ROUNDS = 5
+
+# Retriever configurations to compare. The first one mirrors what init_rag() builds today
+# (minus the LLM-generated questions appended to PDF chunks, which need the OpenAI API).
+# Sharded configs route with the retriever's own k, as in init_rag(), so they return only k
+# chunks and recall@ beyond k is reported as "-".
+BENCH_CONFIGS = [
+    {"name": "current", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n\n", "search_type": "sharded", "k": 4},
+    {"name": "current-no-fanout", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n\n", "search_type": "sharded", "k": 4, "fanout_margin": 0.0},
+    {"name": "flat-similarity", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n\n", "search_type": "similarity"},
+    {"name": "nl-500-similarity", "chunk_size": 500, "chunk_overlap": 50, "separator": "\n", "search_type": "similarity"},
+    {"name": "nl-1000-similarity", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n", "search_type": "similarity"},
+    {"name": "nl-2000-similarity", "chunk_size": 2000, "chunk_overlap": 100, "separator": "\n", "search_type": "similarity"},
+    {"name": "nl-1000-mmr", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n", "search_type": "mmr"},
+    {"name": "nl-1000-sharded", "chunk_size": 1000, "chunk_overlap": 50, "separator": "\n", "search_type": "sharded", "k": 4},
+]
+
+# Labelled queries. A retrieved chunk counts as relevant if it contains `relevant`
+# (case and whitespace insensitive) and, when `source` is set, comes from a file whose
+# path contains it. Queries with no relevant chunk in an index count as misses.
+PDF_QUERIES = [
+    {"id": "R1", "query": "What is the overall deductible on the 2,500 plan?", "relevant": "$2,500/individual or $5,000/family", "source": "2500_Gold"},
+    {"id": "R2", "query": "What is the out-of-pocket limit for the 5000 HSA plan?", "relevant": "$6,550/individual or $13,100/family", "source": "5000_HSA"},
+    {"id": "R3", "query": "Do I need a referral to see a specialist?", "relevant": "need a referral to see a specialist"},
+    {"id": "R4", "query": "Which services does the plan not cover?", "relevant": "Bariatric surgery"},
+    {"id": "R5", "query": "How many chiropractic visits are covered per calendar year?", "relevant": "visits for Chiropractic"},
+    {"id": "R6", "query": "What happens if I don't get precertification before a hospital stay?", "relevant": "Failure to obtain precertification will result in a 50% benefit reduction"},
+    {"id": "R7", "query": "Are children's eye exams and glasses covered?", "relevant": "Children's glasses Not covered"},
+    {"id": "R8", "query": "How many days of skilled nursing care are covered?", "relevant": "Limited to 60 days per Calendar Year"},
+    {"id": "R9", "query": "What are the copays for a 90 day supply of generic and brand name drugs?", "relevant": "31-90 day supply"},
+    {"id": "R10", "query": "Who do I contact to file a grievance or appeal a denied claim?", "relevant": "Detego Health at 866-815-6001"},
+    {"id": "R11", "query": "Does this plan provide Minimum Essential Coverage?", "relevant": "Minimum Essential Coverage? Yes"},
+    {"id": "R12", "query": "How much would Peg pay for having a baby?", "relevant": "The total Peg would pay is"},
+    {"id": "R13", "query": "What number do I call for help in Spanish?", "relevant": "Para obtener asistencia en Español"},
+    {"id": "R14", "query": "Where can I find more information about prescription drug coverage?", "relevant": "www.medalistrx.com"},
+    {"id": "R15", "query": "What is the copay for urgent care?", "relevant": "Urgent care"},
+    {"id": "R16", "query": "Is there a limit on durable medical equipment rental?", "relevant": "Limited to 12 month rental or purchase price"},
+]
+
+# Only answerable from the fixture in FAQ_FIXTURE_DIR, so skipped when --faq-dir points elsewhere
+FAQ_FIXTURE_QUERIES = [
+    {"id": "F1", "query": "What documents do I need to open a demat account?", "relevant": "PAN card, Aadhaar card linked to your mobile number"},
+    {"id": "F2", "query": "Why was my account opening application rejected?", "relevant": "PAN details do not match the Aadhaar details"},
+    {"id": "F3", "query": "How many nominees can I add when opening my account?", "relevant": "add up to three nominees"},
+    {"id": "F4", "query": "How do I transfer funds to my trading account?", "relevant": "pay using UPI, Net Banking or IMPS/NEFT"},
+    {"id": "F5", "query": "Money was debited from my bank but not added to my balance", "relevant": "raise a ticket with the UTR number"},
+    {"id": "F6", "query": "When will my withdrawal be credited to my bank account?", "relevant": "placed before 4:30 PM on a trading day"},
+    {"id": "F7", "query": "Why can't I withdraw my full available balance?", "relevant": "cannot be withdrawn until the settlement is complete"},
+    {"id": "F8", "query": "How do I apply for an IPO?", "relevant": "approve the UPI mandate request"},
+    {"id": "F9", "query": "When is IPO allotment announced?", "relevant": "allotment status is usually announced"},
+    {"id": "F10", "query": "What is the brokerage on equity delivery trades?", "relevant": "Rs 20 or 0.1% per executed order"},
+    {"id": "F11", "query": "How do I link a new bank account?", "relevant": "add the new account by uploading a cancelled cheque"},
+    {"id": "F12", "query": "When is the money blocked for an IPO released if I don't get shares?", "relevant": "unblocked by your bank within one working day"},
+    {"id": "F13", "query": "What are DP charges when I sell shares?", "relevant": "Rs 20 per company per day"},
+    {"id": "F14", "query": "How do I reactivate a dormant account?", "relevant": "complete the re-KYC prompt"},
+]
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how", "i", "if",
+    "in", "is", "it", "me", "my", "of", "on", "or", "the", "there", "this", "to", "what", "which", "who", "with", "you", "your",
+}
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Offline embedder: unigrams and bigrams hashed into a fixed-size, L2-normalised
+    bag-of-words vector. Crude next to OpenAI embeddings, but deterministic and free,
+    so score changes between runs come from the index configuration alone.
+    """
+
+    def __init__(self, size: int = 1024):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        tokens = [t for t in re.findall(r"[a-z0-9$]+(?:[.,/-][a-z0-9]+)*", _normalize(text)) if t not in STOPWORDS]
+        features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        counts = [0.0] * self.size
+        for feature in features:
+            counts[zlib.crc32(feature.encode("utf-8")) % self.size] += 1.0
+        vector = [math.log1p(count) for count in counts]
+        norm = math.sqrt(sum(x * x for x in vector))
+        return [x / norm for x in vector] if norm else vector
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text.replace("’", "'")).strip().lower()
+
+
+def load_corpus(faq_dir: str) -> Dict[str, List[Document]]:
+    """Loads the raw PDFs from sources/ and the FAQ articles in faq_dir without touching the network."""
+    text_loader = DirectoryLoader(faq_dir, glob="**/*.txt", loader_cls=TextLoader)
+    return {
+        "pdf": tag_documents(PyPDFDirectoryLoader(SOURCES_DIR).load(), "pdf"),
+        "faq": tag_documents(text_loader.load(), "faq"),
+    }
+
+
+def split_corpus(corpus: Dict[str, List[Document]], config: Dict[str, Any]) -> List[Document]:
+    pdf_splitter = CharacterTextSplitter(
+        separator=config["separator"], chunk_size=config["chunk_size"], chunk_overlap=config["chunk_overlap"]
+    )
+    # FAQ chunking is kept as in rag_helper.load_angelone_texts()
+    faq_splitter = CharacterTextSplitter(chunk_size=2000, chunk_overlap=100)
+    return pdf_splitter.split_documents(corpus["pdf"]) + faq_splitter.split_documents(corpus["faq"])
+
+
+def is_relevant(doc: Document, label: Dict[str, str]) -> bool:
+    if label.get("source") and label["source"] not in doc.metadata.get("source", ""):
+        return False
+    return _normalize(label["relevant"]) in _normalize(doc.page_content)
+
+
+def build_search(config: Dict[str, Any], chunks: List[Document], embeddings: Embeddings, persist_directory: str):
+    """Builds the index for a config and returns a function mapping a query to its top MAX_K chunks."""
+    if config["search_type"] == "sharded":
+        retriever = build_sharded_retriever(chunks, embeddings, k=config["k"], persist_directory=persist_directory)
+        retriever.fanout_margin = config.get("fanout_margin", retriever.fanout_margin)
+        return retriever.invoke
+
+    db = Chroma.from_documents(chunks, embeddings, collection_name="bench", persist_directory=persist_directory)
+    if config["search_type"] == "mmr":
+        return lambda query: db.max_marginal_relevance_search(query, k=MAX_K, fetch_k=2 * MAX_K)
+    return lambda query: db.similarity_search(query, k=MAX_K)
+
+
+def directory_size(path: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, files in os.walk(path) for name in files
+    )
+
+
+def run_config(
+    config: Dict[str, Any], corpus: Dict[str, List[Document]], queries: List[Dict[str, str]], embeddings: Embeddings
+) -> Dict[str, Any]:
+    chunks = split_corpus(corpus, config)
+    answerable = sum(1 for label in queries if any(is_relevant(chunk, label) for chunk in chunks))
+    persist_directory = tempfile.mkdtemp(prefix="retrieval_bench_")
+    try:
+        build_start = time.perf_counter()
+        search = build_search(config, chunks, embeddings, persist_directory)
+        build_seconds = time.perf_counter() - build_start
+        index_bytes = directory_size(persist_directory)
+
+        ranks = []
+        for label in queries:
+            results = search(label["query"])
+            rank = next((i for i, doc in enumerate(results, 1) if is_relevant(doc, label)), None)
+            ranks.append(rank)
+
+        latencies_ms = []
+        for _ in range(LATENCY_ROUNDS):
+            for label in queries:
+                start = time.perf_counter()
+                search(label["query"])
+                latencies_ms.append((time.perf_counter() - start) * 1000)
+    finally:
+        shutil.rmtree(persist_directory, ignore_errors=True)
+
+    if len(latencies_ms) > 1:
+        percentiles = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+    else:
+        percentiles = [latencies_ms[0] if latencies_ms else 0.0] * 99
+    result = {
+        "name": config["name"],
+        "chunks": len(chunks),
+        "answerable": f"{answerable}/{len(queries)}",
+        f"mrr@{MRR_AT}": sum(1 / rank for rank in ranks if rank and rank <= MRR_AT) / len(ranks) if ranks else 0.0,
+        "build_s": build_seconds,
+        "index_kb": index_bytes / 1024,
+        "p50_ms": percentiles[49],
+        "p99_ms": percentiles[98],
+    }
+    depth = config.get("k", MAX_K)
+    for k in RECALL_AT:
+        if k > depth:
+            result[f"recall@{k}"] = None
+        else:
+            result[f"recall@{k}"] = sum(1 for rank in ranks if rank and rank <= k) / len(ranks) if ranks else 0.0
+    return result
+
+
+def _format_cell(value: Any) -> str:
+    if value is None:
+        return "-"
+    return f"{value:.3f}" if isinstance(value, float) else str(value)
+
+
+def print_report(results: List[Dict[str, Any]]):
+    columns = ["name", "chunks", "answerable"] + [f"recall@{k}" for k in RECALL_AT] + [f"mrr@{MRR_AT}", "build_s", "index_kb", "p50_ms", "p99_ms"]
+    rows = [[_format_cell(res[col]) for col in columns] for res in results]
+    widths = [max(len(col), *(len(row[i]) for row in rows)) for i, col in enumerate(columns)]
+    print("  ".join(col.ljust(width) for col, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark over sources/.")
+    parser.add_argument("--min-recall", type=float, help="Fail if any config's recall@4 falls below this.")
+    parser.add_argument("--max-p99-ms", type=float, help="Fail if any config's p99 search latency exceeds this.")
+    parser.add_argument(
+        "--faq-dir", default=FAQ_FIXTURE_DIR,
+        help="FAQ articles to index, e.g. sources/angelone-support. Labelled FAQ queries only run against the fixture.",
+    )
+    args = parser.parse_args()
+    use_fixture = os.path.normpath(args.faq_dir) == os.path.normpath(FAQ_FIXTURE_DIR)
+    queries = PDF_QUERIES + FAQ_FIXTURE_QUERIES if use_fixture else PDF_QUERIES
+
+    bench_start = time.perf_counter()
+    embeddings = HashingEmbeddings()
+    corpus = load_corpus(args.faq_dir)
+    print(f"Loaded {len(corpus['pdf'])} PDF pages and {len(corpus['faq'])} FAQ articles from {args.faq_dir}.")
+    if not use_fixture:
+        print(f"Skipping the {len(FAQ_FIXTURE_QUERIES)} FAQ queries labelled against {FAQ_FIXTURE_DIR}.")
+
+    # Untimed warm-up so Chroma's one-off client start-up isn't charged to the first config
+    run_config(BENCH_CONFIGS[0], corpus, queries, embeddings)
+    results = [run_config(config, corpus, queries, embeddings) for config in BENCH_CONFIGS]
+    print()
+    print_report(results)
+    print(f"\nFinished in {time.perf_counter() - bench_start:.1f}s.")
+
+    failures = []
+    for res in results:
+        if args.min_recall is not None and res["recall@4"] < args.min_recall:
+            failures.append(f"{res['name']}: recall@4 {res['recall@4']:.3f} < {args.min_recall}")
+        if args.max_p99_ms is not None and res["p99_ms"] > args.max_p99_ms:
+            failures.append(f"{res['name']}: p99 {res['p99_ms']:.1f}ms > {args.max_p99_ms}ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,6 +20,13 @@ def sanitize_filename(title):
     sanitized = sanitized[:100]
     return sanitized
 
+def extract_support_category(url):
+    """Returns the support category from a /support/<category>/... URL, or None."""
+    path = urlparse(url).path
+    if not ARTICLE_URL_PATTERN.search(path):
+        return None
+    return path.strip('/').split('/')[1].lower()
+
 def fetch_page(url):
     """Fetches the content of a given URL."""
     try:
@@ -0,0 +1,186 @@
+import logging
+import math
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_community.vectorstores import Chroma
+from scraper import extract_support_category
+
+logger = logging.getLogger("sharded_index")
+
+# --- Configuration ---
+PDF_SHARD = "pdf"
+FAQ_SHARD_PREFIX = "faq-"
+DEFAULT_FAQ_CATEGORY = "general"
+
+# Shards whose centroid similarity is within this margin of the best shard are
+# searched as well, since the router can't tell them apart with confidence.
+FANOUT_MARGIN = 0.05
+MAX_FANOUT = 3
+
+# One pool shared by every retriever, so fanning out neither pays thread start-up per query
+# nor leaks threads per retriever that gets built
+_FANOUT_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_FANOUT, thread_name_prefix="shard-search")
+
+
+def tag_documents(docs: List[Document], source_type: str) -> List[Document]:
+    """Sets the source_type (and for FAQ articles, the support category) metadata used for sharding."""
+    for doc in docs:
+        doc.metadata["source_type"] = source_type
+        if source_type == "faq":
+            # The scraper writes the article URL on the first line; its path carries the support category
+            url_match = re.match(r'Source URL: (\S+)', doc.page_content)
+            category = extract_support_category(url_match.group(1)) if url_match else None
+            doc.metadata["category"] = category or DEFAULT_FAQ_CATEGORY
+    return docs
+
+
+def shard_name_for(doc: Document) -> str:
+    """Returns the shard a chunk belongs to, based on its source type and support category."""
+    if doc.metadata.get("source_type") != "faq":
+        return PDF_SHARD
+    category = doc.metadata.get("category") or DEFAULT_FAQ_CATEGORY
+    # Chroma collection names only allow [a-zA-Z0-9._-] and must end alphanumeric
+    category = re.sub(r'[^a-zA-Z0-9._-]', '-', category).strip('._-') or DEFAULT_FAQ_CATEGORY
+    return (FAQ_SHARD_PREFIX + category)[:63]
+
+
+def _cosine_similarity(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _centroid(vectors: List[List[float]]) -> List[float]:
+    count = len(vectors)
+    return [sum(column) / count for column in zip(*vectors)]
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Retriever over one Chroma collection per shard. The query is embedded once,
+    routed to the shard(s) with the closest centroid, and only those are searched.
+    """
+    shards: Dict[str, Any]
+    centroids: Dict[str, List[float]]
+    shard_sizes: Dict[str, int]
+    embeddings: Embeddings
+    k: int = 4
+    fanout_margin: float = FANOUT_MARGIN
+    max_fanout: int = MAX_FANOUT
+
+    def route(self, query_embedding: List[float]) -> List[str]:
+        """
+        Returns the shards to search, best first. More than one means the router was unsure,
+        or that the closer shards hold fewer than k chunks between them and need backfilling.
+        """
+        ranked = sorted(
+            ((_cosine_similarity(query_embedding, centroid), name) for name, centroid in self.centroids.items()),
+            reverse=True,
+        )
+        best_score = ranked[0][0]
+        selected = [name for score, name in ranked[:self.max_fanout] if best_score - score <= self.fanout_margin]
+        for _, name in ranked[len(selected):]:
+            if sum(self.shard_sizes[shard] for shard in selected) >= self.k:
+                break
+            selected.append(name)
+        return selected
+
+    def _search_shard(self, name: str, query_embedding: List[float]) -> List[Tuple[Document, float]]:
+        return self.shards[name].similarity_search_by_vector_with_relevance_scores(query_embedding, k=self.k)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        query_embedding = self.embeddings.embed_query(query)
+        selected = self.route(query_embedding)
+        logger.debug("Routing query to shards: %s", ", ".join(selected))
+
+        if len(selected) == 1:
+            results = self._search_shard(selected[0], query_embedding)
+        else:
+            shard_results = _FANOUT_EXECUTOR.map(lambda name: self._search_shard(name, query_embedding), selected)
+            results = [hit for hits in shard_results for hit in hits]
+
+        # All shards share the embedding model and distance metric, so distances are comparable
+        results.sort(key=lambda hit: hit[1])
+        return [doc for doc, _ in results[:self.k]]
+
+
+def build_sharded_retriever(
+    documents: List[Document], embeddings: Embeddings, k: int = 4, persist_directory: Optional[str] = None
+) -> ShardedRetriever:
+    """Splits the documents into shards, indexes each in its own Chroma collection and computes its centroid."""
+    if not documents:
+        raise ValueError("No documents to index: check that sources/ has PDFs or the FAQ scrape succeeded.")
+
+    grouped: Dict[str, List[Document]] = {}
+    for doc in documents:
+        grouped.setdefault(shard_name_for(doc), []).append(doc)
+
+    shards = {}
+    centroids = {}
+    shard_sizes = {}
+    for name, shard_docs in grouped.items():
+        print(f"Indexing shard '{name}' with {len(shard_docs)} chunks.")
+        db = Chroma.from_documents(
+            shard_docs, embeddings, collection_name=name, persist_directory=persist_directory
+        )
+        stored = db.get(include=["embeddings"])
+        shards[name] = db
+        centroids[name] = _centroid([list(map(float, vector)) for vector in stored["embeddings"]])
+        shard_sizes[name] = len(stored["ids"])
+
+    return ShardedRetriever(shards=shards, centroids=centroids, shard_sizes=shard_sizes, embeddings=embeddings, k=k)
+
+
+class _FixedEmbeddings(Embeddings):
+    """Looks texts up in a fixed table, so the self-check below controls every distance."""
+
+    def __init__(self, vectors: Dict[str, List[float]]):
+        self.vectors = vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self.vectors[text] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.vectors[text]
+
+
+def self_check():
+    """
+    Checks routing, backfill and the cross-shard merge on a tiny index: the query is routed
+    to a one-chunk FAQ shard, so with k=3 the PDF shard must be searched too, and one PDF
+    chunk is nearer than the FAQ chunk, so the merged results must be re-sorted by distance.
+    """
+    vectors = {
+        "faq chunk": [0.0, 1.0],
+        "pdf near": [0.3, 0.95],
+        "pdf mid": [0.8, 0.6],
+        "pdf far": [1.0, 0.0],
+        "query": [0.3, 1.0],
+    }
+    documents = [Document(page_content="faq chunk", metadata={"source_type": "faq", "category": "tiny"})]
+    documents += [Document(page_content=text, metadata={"source_type": "pdf"}) for text in ("pdf far", "pdf near", "pdf mid")]
+
+    with tempfile.TemporaryDirectory() as persist_directory:
+        retriever = build_sharded_retriever(documents, _FixedEmbeddings(vectors), k=3, persist_directory=persist_directory)
+        retriever.fanout_margin = 0.0
+        assert retriever.route(vectors["query"]) == ["faq-tiny", PDF_SHARD], "tiny shard was not backfilled"
+        results = [doc.page_content for doc in retriever.invoke("query")]
+
+    expected = sorted(
+        (text for text in vectors if text != "query"),
+        key=lambda text: math.dist(vectors[text], vectors["query"]),
+    )[:3]
+    assert results == expected, f"merged results {results} are not in distance order {expected}"
+    print("sharded_index self-check passed.")
+
+
+if __name__ == "__main__":
+    self_check()